@@ -20,62 +20,216 @@ City2: City3(3)
 City3:
 """
 
+import os
 import sys
 import json
-from typing import Dict, List, Set, Tuple
+import time
+from array import array
+from collections.abc import KeysView, Mapping
+from functools import lru_cache
+from types import MappingProxyType
+from typing import IO, Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Type, Union
+
+
+# shared out-edge placeholder for nodes that have no roads yet
+_NO_EDGES: Tuple[int, ...] = ()
+# and the matching read-only {target id: position} index
+_NO_POSITIONS: Mapping = MappingProxyType({})
+
+
+class _NeighborView(Mapping):
+    """Read-only {neighbor: weight} view of one node's out-edges."""
+    
+    __slots__ = ('_graph', '_index')
+    
+    def __init__(self, graph: "Graph", index: int):
+        self._graph = graph
+        self._index = index
+    
+    def __getitem__(self, neighbor: str) -> int:
+        target = self._graph.node_id.get(neighbor)
+        position = self._graph.positions[self._index].get(target)
+        if position is None:
+            raise KeyError(neighbor)
+        return self._graph.weights[self._index][position]
+    
+    def __iter__(self) -> Iterator[str]:
+        names = self._graph.names
+        return (names[target] for target in self._graph.neighbors[self._index])
+    
+    def __len__(self) -> int:
+        return len(self._graph.neighbors[self._index])
+
+
+class _EdgeView(Mapping):
+    """Read-only {city: {neighbor: weight}} view over a Graph."""
+    
+    __slots__ = ('_graph',)
+    
+    def __init__(self, graph: "Graph"):
+        self._graph = graph
+    
+    def __getitem__(self, city: str) -> _NeighborView:
+        return _NeighborView(self._graph, self._graph.node_id[city])
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._graph.node_id)
+    
+    def __len__(self) -> int:
+        return len(self._graph.node_id)
 
 
 class Graph:
-    """Directed weighted graph for storing cities and roads."""
+    """Directed weighted graph for storing cities and roads.
+
+    Roads are kept per integer node id in parallel ``neighbors``/``weights`` lists.
+    """
+    
+    # subclasses that add attributes must declare their own __slots__
+    __slots__ = ('node_id', 'names', 'neighbors', 'weights', 'positions')
     
     def __init__(self):
-        self.nodes: Set[str] = set()
-        self.edges: Dict[str, Dict[str, int]] = {}
+        self.node_id: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.neighbors: List[Sequence[int]] = []
+        self.weights: List[Sequence[int]] = []
+        self.positions: List[Mapping] = []
+    
+    @property
+    def nodes(self) -> KeysView:
+        return self.node_id.keys()
+    
+    @property
+    def edges(self) -> _EdgeView:
+        return _EdgeView(self)
     
     def add_node(self, node: str) -> None:
         # ensure node is in the graph
-        self.nodes.add(node)
-        self.edges.setdefault(node, {})
+        if node not in self.node_id:
+            self.node_id[node] = len(self.names)
+            self.names.append(node)
+            self.neighbors.append(_NO_EDGES)
+            self.weights.append(_NO_EDGES)
+            self.positions.append(_NO_POSITIONS)
     
     def connect(self, from_node: str, to_node: str, weight: int) -> None:
         # create directed edge with weight
-        self.nodes.add(from_node)
-        self.nodes.add(to_node)
-        self.edges.setdefault(from_node, {})
-        self.edges[from_node][to_node] = weight
+        self.add_node(from_node)
+        self.add_node(to_node)
+        source, target = self.node_id[from_node], self.node_id[to_node]
+        neighbors = self.neighbors[source]
+        if neighbors is _NO_EDGES:
+            neighbors = self.neighbors[source] = []
+            self.weights[source] = array('q')
+            self.positions[source] = {}
+        positions = self.positions[source]
+        position = positions.get(target)
+        weights = self.weights[source]
+        try:
+            if position is not None:
+                # keep the road's original position, last weight wins
+                weights[position] = weight
+            else:
+                weights.append(weight)
+        except OverflowError:
+            # out of int64 range: keep this node's weights as boxed ints
+            weights = self.weights[source] = list(weights)
+            if position is not None:
+                weights[position] = weight
+            else:
+                weights.append(weight)
+        if position is None:
+            positions[target] = len(neighbors)
+            neighbors.append(target)
     
     def remove_node(self, node: str) -> None:
-        if node in self.nodes:
-            self.nodes.remove(node)
-            if node in self.edges:
-                del self.edges[node]
+        index = self.node_id.pop(node, None)
+        if index is None:
+            return
+        # the last node moves into the freed id so no other id changes
+        last = len(self.names) - 1
+        sources = [source for source, positions in enumerate(self.positions)
+                   if index in positions or last in positions]
+        for source in sources:
+            if source == index:
+                continue
+            positions = self.positions[source]
             # remove incoming edges
-            for neighbor_edges in self.edges.values():
-                neighbor_edges.pop(node, None)
+            position = positions.get(index)
+            if position is not None:
+                self._drop_road(source, position)
+            # roads into the moved node point at its new id
+            position = positions.get(last)
+            if position is not None and index != last:
+                self.neighbors[source][position] = index
+                del positions[last]
+                positions[index] = position
+        if index != last:
+            moved = self.names[index] = self.names[last]
+            self.neighbors[index] = self.neighbors[last]
+            self.weights[index] = self.weights[last]
+            self.positions[index] = self.positions[last]
+            self.node_id[moved] = index
+        del self.names[last]
+        del self.neighbors[last]
+        del self.weights[last]
+        del self.positions[last]
     
     def remove_edge(self, from_node: str, to_node: str) -> None:
-        if from_node in self.edges:
-            self.edges[from_node].pop(to_node, None)
+        source, target = self.node_id.get(from_node), self.node_id.get(to_node)
+        if source is None or target is None:
+            return
+        position = self.positions[source].get(target)
+        if position is not None:
+            self._drop_road(source, position)
+    
+    def _drop_road(self, source: int, position: int) -> None:
+        """Delete the road at position in source's lists."""
+        neighbors, positions = self.neighbors[source], self.positions[source]
+        del positions[neighbors[position]]
+        del neighbors[position]
+        del self.weights[source][position]
+        # roads after the removed one move up by one
+        for later in neighbors[position:]:
+            positions[later] -= 1
     
     def to_adjacency_lines(self, input_cities: List[str]) -> List[str]:
         """Convert graph to adjacency list format."""
+        names, node_id = self.names, self.node_id
+        neighbors, weights = self.neighbors, self.weights
         lines = []
         for city in input_cities:
-            if city in self.edges and self.edges[city]:
+            index = node_id.get(city)
+            if index is not None and neighbors[index]:
                 # use insertion order instead of alphabetical
-                neighbors = list(self.edges[city].items())
-                neighbor_str = ", ".join([f"{neighbor}({weight})" for neighbor, weight in neighbors])
-                lines.append(f"{city}: {neighbor_str}")
+                parts = [f"{names[target]}({weight})" for target, weight
+                         in zip(neighbors[index], weights[index])]
+                lines.append(f"{city}: " + ", ".join(parts))
             else:
                 lines.append(f"{city}:")
         return lines
     
+    def copy(self) -> "Graph":
+        """Return an independent copy of the graph."""
+        clone = type(self)()
+        clone.node_id = dict(self.node_id)
+        clone.names = list(self.names)
+        # slicing copies lists and arrays; the shared _NO_EDGES tuple stays shared
+        clone.neighbors = [neighbors[:] for neighbors in self.neighbors]
+        clone.weights = [weights[:] for weights in self.weights]
+        clone.positions = [positions if positions is _NO_POSITIONS else dict(positions)
+                           for positions in self.positions]
+        return clone
+    
     def to_json(self, input_cities: List[str]) -> str:
         """Convert graph to JSON format."""
         result = {}
+        names = self.names
         for city in input_cities:
-            if city in self.edges:
-                result[city] = self.edges[city]
+            index = self.node_id.get(city)
+            if index is not None:
+                result[city] = {names[target]: weight for target, weight
+                                in zip(self.neighbors[index], self.weights[index])}
             else:
                 result[city] = {}
         return json.dumps(result, indent=2)
@@ -83,19 +237,83 @@ class Graph:
 
 def validate_weight(weight_str: str, line_num: int) -> int:
     """Validate and convert weight string to integer."""
-    try:
+    # plain digits skip the try; int() still decides anything else, e.g. '1_000'
+    digits = weight_str[1:] if weight_str.startswith(('+', '-')) else weight_str
+    if digits.isdecimal():
         weight = int(weight_str)
-        if weight < 0:
-            print(f"Error: Negative weight '{weight}' on line {line_num}", file=sys.stderr)
+    else:
+        try:
+            weight = int(weight_str)
+        except ValueError:
+            print(f"Error: Invalid weight '{weight_str}' on line {line_num}", file=sys.stderr)
             sys.exit(1)
-        return weight
-    except ValueError:
-        print(f"Error: Invalid weight '{weight_str}' on line {line_num}", file=sys.stderr)
+    
+    if weight < 0:
+        print(f"Error: Negative weight '{weight}' on line {line_num}", file=sys.stderr)
         sys.exit(1)
+    return weight
+
+
+def add_city_to_trie(trie: Dict, city: str) -> None:
+    """Insert a city into a token trie built by build_city_trie."""
+    node = trie
+    for token in city.split():
+        node = node.setdefault(token, {})
+    node[None] = city
+
+
+def build_city_trie(cities: Iterable[str]) -> Dict:
+    """Build a trie keyed on city name tokens.
+
+    ``trie["New"]["York"][None] == "New York"``; the ``None`` key marks the
+    end of a full city name.
+    """
+    trie = {}
+    for city in cities:
+        add_city_to_trie(trie, city)
+    return trie
+
+
+def _match_city(trie: Dict, tokens: List[str], start: int) -> Optional[str]:
+    """Return the city spelled by tokens[start:], or None."""
+    node = trie
+    for i in range(start, len(tokens)):
+        node = node.get(tokens[i])
+        if node is None:
+            return None
+    return node.get(None)
+
+
+def _walk_city_split(tokens: Sequence[str], trie: Dict) -> Tuple[str, str]:
+    """Walk the trie once from the left, returning the first valid split."""
+    node = trie
+    for i in range(len(tokens) - 1):
+        node = node.get(tokens[i])
+        if node is None:
+            break
+        city1 = node.get(None)
+        if city1 is not None:
+            city2 = _match_city(trie, tokens, i + 1)
+            if city2 is not None:
+                return city1, city2
+    
+    return None, None
 
 
-def find_city_split(tokens: List[str], valid_cities: Set[str]) -> Tuple[str, str]:
-    """Find valid split between two cities in token list."""
+@lru_cache(maxsize=8)
+def _city_trie(cities: FrozenSet[str]) -> Dict:
+    """build_city_trie, memoized per frozen city set."""
+    return build_city_trie(cities)
+
+
+@lru_cache(maxsize=4096)
+def _split_cached(tokens: Tuple[str, ...], cities: FrozenSet[str]) -> Tuple[str, str]:
+    """Memoized split for callers that pass a frozenset of cities."""
+    return _walk_city_split(tokens, _city_trie(cities))
+
+
+def _scan_city_split(tokens: List[str], valid_cities: Set[str]) -> Tuple[str, str]:
+    """Try each split point from the left against the city set."""
     for i in range(1, len(tokens)):
         city1 = ' '.join(tokens[:i])
         city2 = ' '.join(tokens[i:])
@@ -106,26 +324,128 @@ def find_city_split(tokens: List[str], valid_cities: Set[str]) -> Tuple[str, str
     return None, None
 
 
-def parse_input_to_graph(filename: str) -> Tuple[Graph, List[str]]:
-    """Parse input file and build graph."""
-    graph = Graph()
-    input_cities = []
+def find_city_split(tokens: List[str], valid_cities: Set[str],
+                    trie: Optional[Dict] = None) -> Tuple[str, str]:
+    """Find valid split between two cities in token list.
+
+    Pass a prebuilt ``trie`` to walk it once from the left; frozenset
+    inputs are memoized, and any other city set is scanned directly.
+    """
+    if trie is not None:
+        return _walk_city_split(tokens, trie)
+    
+    if isinstance(valid_cities, frozenset):
+        return _split_cached(tuple(tokens), valid_cities)
+    return _scan_city_split(tokens, valid_cities)
+
+
+def parse_input_to_graph(src: Union[str, IO], graph_cls: Type[Graph] = Graph) -> Tuple[Graph, List[str]]:
+    """Parse input file and build graph.
+
+    ``src`` is a file path or an already open file-like object (text or
+    binary). The whole input is read as bytes and split into lines with one
+    splitlines() call; each line is decoded before it is parsed.
+    ``graph_cls`` lets callers build a Graph subclass such as TrafficGraph
+    directly.
+    """
+    if hasattr(src, 'read'):
+        data = src.read()
+        if isinstance(data, str):
+            return parse_input_to_graph_from_str(data, graph_cls)
+        try:
+            return _parse_input_bytes(data, graph_cls)
+        except UnicodeDecodeError as e:
+            _exit_read_error(getattr(src, 'name', src), e)
     
     try:
-        with open(filename, 'r') as f:
-            lines = f.readlines()
-    except FileNotFoundError:
-        print(f"Error: File '{filename}' not found.", file=sys.stderr)
-        sys.exit(1)
-    except Exception as e:
-        print(f"Error reading file '{filename}': {e}", file=sys.stderr)
-        sys.exit(1)
+        with open(src, 'rb') as f:
+            data = f.read()
+        return _parse_input_bytes(data, graph_cls)
+    except (OSError, UnicodeDecodeError) as e:
+        _exit_read_error(src, e)
+
+
+def parse_input_to_graph_cached(path: str, graph_cls: Type[Graph] = Graph) -> Tuple[Graph, List[str]]:
+    """Like parse_input_to_graph for a path, but memoized on the file's identity, size, and change times."""
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        _exit_read_error(path, e)
+    if time.time_ns() - stat.st_mtime_ns < _RACY_WINDOW_NS:
+        # a same-size rewrite this soon could keep the same timestamps
+        return parse_input_to_graph(path, graph_cls)
+    
+    try:
+        graph, input_cities = _parse_path_cached(os.path.realpath(path), stat.st_dev, stat.st_ino,
+                                                 stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns,
+                                                 graph_cls)
+    except (OSError, UnicodeDecodeError) as e:
+        _exit_read_error(path, e)
+    
+    # the cached graph is shared, so callers get a copy they may mutate
+    return graph.copy(), list(input_cities)
+
+
+def _exit_read_error(path, error: Exception) -> None:
+    """Report a failure to read path and exit."""
+    if isinstance(error, FileNotFoundError):
+        print(f"Error: File '{path}' not found.", file=sys.stderr)
+    else:
+        print(f"Error reading file '{path}': {error}", file=sys.stderr)
+    sys.exit(1)
+
+
+def parse_input_to_graph_from_str(text: str, graph_cls: Type[Graph] = Graph) -> Tuple[Graph, List[str]]:
+    """Parse input given as a string and build graph, without touching the filesystem."""
+    return _parse_input_bytes(text.encode('utf-8'), graph_cls)
+
+
+# files modified this recently are parsed afresh rather than trusted to the
+# cache, since timestamps are too coarse to tell two quick writes apart
+_RACY_WINDOW_NS = 2 * 10 ** 9
+
+
+@lru_cache(maxsize=128)
+def _parse_path_cached(real_path: str, dev: int, ino: int, size: int, mtime_ns: int,
+                       ctime_ns: int, graph_cls: Type[Graph]) -> Tuple[Graph, List[str]]:
+    """Read and parse real_path; memoized on the file's identity and stat data.
+
+    Read and decode errors propagate to the caller, and inputs that fail to
+    parse exit via SystemExit, so neither is ever cached.
+    """
+    with open(real_path, 'rb') as f:
+        data = f.read()
+    return _parse_input_bytes(data, graph_cls)
+
+
+def _parse_input_bytes(data: bytes, graph_cls: Type[Graph]) -> Tuple[Graph, List[str]]:
+    """Build a graph from the raw bytes of an input file.
+
+    Input that is not valid UTF-8 raises UnicodeDecodeError positioned within
+    data.
+    """
+    # lines are only decoded while parsing, so this is where bad UTF-8 shows up
+    try:
+        return _parse_input_lines(data, graph_cls)
+    except UnicodeDecodeError:
+        # decoding the whole input reports the offset within the file, not the slice
+        data.decode('utf-8')
+        raise
+
+
+def _parse_input_lines(data: bytes, graph_cls: Type[Graph]) -> Tuple[Graph, List[str]]:
+    """Run the CITIES/ROADS line parser over data."""
+    graph = graph_cls()
+    input_cities = []
+    seen_cities = set()
+    city_trie = {}
     
     in_cities = False
     in_roads = False
     
-    for line_num, line in enumerate(lines, 1):
-        line = line.strip()
+    for line_num, line in enumerate(data.splitlines(), 1):
+        # decoded before stripping so Unicode whitespace is trimmed as well
+        line = line.decode('utf-8').strip()
         
         if not line or line.startswith('#'):
             continue
@@ -140,30 +460,36 @@ def parse_input_to_graph(filename: str) -> Tuple[Graph, List[str]]:
             continue
         
         if in_cities:
-            city = line
-            if city in input_cities:
+            # interned so every dict keyed by this city shares one string object
+            city = sys.intern(line)
+            if city in seen_cities:
                 print(f"Error: Duplicate city '{city}' on line {line_num}", file=sys.stderr)
                 sys.exit(1)
+            seen_cities.add(city)
             input_cities.append(city)
+            add_city_to_trie(city_trie, city)
             graph.add_node(city)
         
         elif in_roads:
-            tokens = line.split()
-            if len(tokens) < 3:
+            parts = line.rsplit(None, 1)
+            city_tokens = parts[0].split()
+            if len(parts) < 2 or len(city_tokens) < 2:
                 print(f"Error: Invalid road format on line {line_num}: '{line}'", file=sys.stderr)
                 print("Expected: 'City1 City2 weight'", file=sys.stderr)
                 sys.exit(1)
             
-            weight_str = tokens[-1]
-            city_tokens = tokens[:-1]
-            
-            city1, city2 = find_city_split(city_tokens, graph.nodes)
+            city1, city2 = find_city_split(city_tokens, graph.nodes, city_trie)
             if not city1 or not city2:
                 print(f"Error: Could not parse cities from line {line_num}: '{line}'", file=sys.stderr)
                 print("Make sure both cities are declared in the CITIES section", file=sys.stderr)
                 sys.exit(1)
             
-            weight = validate_weight(weight_str, line_num)
+            # plain digits are the common case; anything else goes through validate_weight
+            weight_str = parts[1]
+            if weight_str.isdecimal():
+                weight = int(weight_str)
+            else:
+                weight = validate_weight(weight_str, line_num)
             graph.connect(city1, city2, weight)
     
     if not input_cities:
@@ -188,9 +514,9 @@ def main():
         if output_json:
             print(graph.to_json(input_cities))
         else:
+            # one write for the whole listing instead of a print per city
             adjacency_lines = graph.to_adjacency_lines(input_cities)
-            for line in adjacency_lines:
-                print(line)
+            sys.stdout.write("\n".join(adjacency_lines) + "\n")
             
     except Exception as e:
         print(f"Unexpected error: {e}", file=sys.stderr)
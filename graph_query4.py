@@ -8,144 +8,427 @@ Usage: python3 graph_query4.py <graph_file> <commands_file>
 
 import sys
 import heapq
-from typing import Dict, List, Tuple, Optional
-from collections import defaultdict
+from array import array
+from typing import Dict, List, Sequence, Tuple, Optional
 from graph_builder4 import Graph, parse_input_to_graph
 
 
+# heap keys pack (cost << _NODE_BITS) | node into one int, which orders
+# exactly like the (cost, node) tuple but compares in a single step
+_NODE_BITS = 32
+_NODE_MASK = (1 << _NODE_BITS) - 1
+
+
+def _weight_buffer(values) -> Sequence[int]:
+    """array('q') of values, or a plain list if any is outside int64."""
+    try:
+        return array('q', values)
+    except OverflowError:
+        return list(values)
+
+
+def _dijkstra_csr(indptr, neighbors, edge_weights,
+                  start: int, end: int, n: int) -> Tuple[List[int], List[int]]:
+    """Dijkstra over CSR arrays of city ids.
+
+    Returns ``(distances, parent)`` lists indexed by city id, with -1 for
+    cities that were not reached. The search stops once ``end`` is settled;
+    pass ``end=-1`` to settle every reachable city.
+    Only flat arrays and ints are touched so the loop stays free of dict and
+    string work.
+    """
+    distances = [-1] * n
+    parent = [-1] * n
+    distances[start] = 0
+    pq = [start]  # key for cost 0
+    
+    while pq:
+        key = heapq.heappop(pq)
+        current_cost = key >> _NODE_BITS
+        u = key & _NODE_MASK
+        
+        # stale entry: u was already settled through a cheaper push
+        if current_cost > distances[u]:
+            continue
+        
+        if u == end:
+            break
+        
+        for k in range(indptr[u], indptr[u + 1]):
+            v = neighbors[k]
+            new_cost = current_cost + edge_weights[k]
+            if distances[v] < 0 or new_cost < distances[v]:
+                distances[v] = new_cost
+                parent[v] = u
+                heapq.heappush(pq, (new_cost << _NODE_BITS) | v)
+    
+    return distances, parent
+
+
+def _astar_csr(indptr, neighbors, edge_weights, start: int, end: int, n: int,
+               landmark_dists: List[Tuple[List[int], int]]) -> Tuple[List[int], List[int]]:
+    """A* variant of _dijkstra_csr, ordered by cost plus the best ALT bound from landmark_dists."""
+    distances = [-1] * n
+    parent = [-1] * n
+    bounds = [-1] * n
+    distances[start] = 0
+    # start is the only entry and is popped first, so it needs no real bound
+    bounds[start] = 0
+    pq = [start]
+    
+    while pq:
+        key = heapq.heappop(pq)
+        u = key & _NODE_MASK
+        current_cost = (key >> _NODE_BITS) - bounds[u]
+        
+        if current_cost > distances[u]:
+            continue
+        
+        if u == end:
+            break
+        
+        for k in range(indptr[u], indptr[u + 1]):
+            v = neighbors[k]
+            new_cost = current_cost + edge_weights[k]
+            if distances[v] < 0 or new_cost < distances[v]:
+                distances[v] = new_cost
+                parent[v] = u
+                bound = bounds[v]
+                if bound < 0:
+                    bound = 0
+                    for landmark_to, to_end in landmark_dists:
+                        to_v = landmark_to[v]
+                        if to_v >= 0 and to_end - to_v > bound:
+                            bound = to_end - to_v
+                    bounds[v] = bound
+                heapq.heappush(pq, ((new_cost + bound) << _NODE_BITS) | v)
+    
+    return distances, parent
+
+
+class _PathKey:
+    """One partial path of find_k_paths, linked to its parent and ordered by its city ids."""
+    
+    __slots__ = ('node', 'parent', 'path')
+    
+    def __init__(self, node: int, parent: Optional["_PathKey"]):
+        self.node = node
+        self.parent = parent
+        self.path: Optional[Tuple[int, ...]] = None
+    
+    def ids(self) -> Tuple[int, ...]:
+        """City ids from the start city to this one."""
+        if self.path is not None:
+            return self.path
+        # walk up to the nearest key that already has its path built
+        pending = []
+        key = self
+        while key is not None and key.path is None:
+            pending.append(key)
+            key = key.parent
+        path = key.path if key is not None else ()
+        for key in reversed(pending):
+            path = key.path = path + (key.node,)
+        return path
+    
+    def __lt__(self, other: "_PathKey") -> bool:
+        return self.ids() < other.ids()
+
+
 class TrafficGraph(Graph):
-    """Extended graph with traffic conditions and pathfinding capabilities."""
+    """Extended graph with traffic conditions and pathfinding capabilities.
+
+    Queries run on a Compressed Sparse Row (CSR) copy of the adjacency dicts:
+    the out-edges of city id ``u`` live in ``csr_neighbors[indptr[u]:indptr[u+1]]``
+    with matching ``csr_weights``, ``traffic_delta`` and ``effective_weights``
+    slots. The CSR copy is rebuilt lazily whenever the underlying graph
+    changes; traffic reports update their edge's slots in place. Weight
+    buffers are ``array('q')`` unless a value falls outside int64, in which
+    case they are plain lists.
+    """
+    
+    __slots__ = ('traffic_map', 'city_names', 'city_id', 'edge_index',
+                 'indptr', 'csr_neighbors', 'csr_weights', 'traffic_delta',
+                 'effective_weights', '_csr_stale', '_sssp_cache')
     
     def __init__(self):
         super().__init__()
         self.traffic_map: Dict[Tuple[str, str], int] = {}
+        self.city_names: List[str] = []
+        self.city_id: Dict[str, int] = {}
+        self.edge_index: Dict[Tuple[str, str], int] = {}
+        self.indptr = array('i')
+        self.csr_neighbors = array('i')
+        self.csr_weights = array('q')
+        self.traffic_delta = array('q')
+        self.effective_weights = array('q')
+        self._csr_stale = True
+        self._sssp_cache: Dict[int, Tuple[List[int], List[int]]] = {}
+    
+    def add_node(self, node: str) -> None:
+        super().add_node(node)
+        self._csr_stale = True
+    
+    def connect(self, from_node: str, to_node: str, weight: int) -> None:
+        super().connect(from_node, to_node, weight)
+        self._csr_stale = True
+    
+    def remove_node(self, node: str) -> None:
+        super().remove_node(node)
+        self._csr_stale = True
+    
+    def remove_edge(self, from_node: str, to_node: str) -> None:
+        super().remove_edge(from_node, to_node)
+        self._csr_stale = True
+    
+    def copy(self) -> "TrafficGraph":
+        """Return an independent copy, including recorded traffic reports."""
+        clone = super().copy()
+        clone.traffic_map = dict(self.traffic_map)
+        return clone
+    
+    def build_csr(self) -> None:
+        """Pack the adjacency lists into CSR arrays indexed by city id."""
+        # ids follow name order so heap ties break exactly as with string keys
+        self.city_names = sorted(self.nodes)
+        self.city_id = {city: i for i, city in enumerate(self.city_names)}
+        # graph node id -> CSR city id
+        remap = [self.city_id[name] for name in self.names]
+        
+        indptr = array('i', [0])
+        neighbors = array('i')
+        weights = []
+        edge_index = {}
+        for city in self.city_names:
+            index = self.node_id[city]
+            for target, weight in zip(self.neighbors[index], self.weights[index]):
+                edge_index[(city, self.names[target])] = len(neighbors)
+                neighbors.append(remap[target])
+                weights.append(weight)
+            indptr.append(len(neighbors))
+        
+        traffic_delta = [0] * len(weights)
+        for edge, delta in self.traffic_map.items():
+            k = edge_index.get(edge)
+            if k is not None:
+                traffic_delta[k] = delta
+        
+        self.indptr = indptr
+        self.csr_neighbors = neighbors
+        self.csr_weights = _weight_buffer(weights)
+        self.traffic_delta = _weight_buffer(traffic_delta)
+        self.effective_weights = _weight_buffer([max(1, w + d) for w, d
+                                                 in zip(weights, traffic_delta)])
+        self.edge_index = edge_index
+        self._csr_stale = False
+        self._sssp_cache.clear()
+    
+    def _refresh_csr(self) -> None:
+        """Rebuild the CSR view if the graph changed since the last query."""
+        if self._csr_stale:
+            self.build_csr()
     
     def apply_traffic_report(self, from_city: str, to_city: str, delta: int) -> None:
         """Apply traffic report to modify edge weights."""
+        from_city, to_city = sys.intern(from_city), sys.intern(to_city)
         self.traffic_map[(from_city, to_city)] = delta
+        if not self._csr_stale:
+            k = self.edge_index.get((from_city, to_city))
+            if k is not None:
+                effective = max(1, self.csr_weights[k] + delta)
+                try:
+                    self.traffic_delta[k] = delta
+                    self.effective_weights[k] = effective
+                except OverflowError:
+                    # out of int64 range: fall back to boxed ints
+                    self.traffic_delta = list(self.traffic_delta)
+                    self.effective_weights = list(self.effective_weights)
+                    self.traffic_delta[k] = delta
+                    self.effective_weights[k] = effective
+                self._sssp_cache.clear()
     
     def get_effective_weight(self, from_city: str, to_city: str) -> Optional[int]:
         """Get effective weight including traffic conditions."""
-        if from_city not in self.edges or to_city not in self.edges[from_city]:
+        if self._csr_stale:
+            # a single lookup is not worth rebuilding the CSR view for
+            if from_city not in self.edges or to_city not in self.edges[from_city]:
+                return None
+            base_weight = self.edges[from_city][to_city]
+            return max(1, base_weight + self.traffic_map.get((from_city, to_city), 0))
+        k = self.edge_index.get((from_city, to_city))
+        if k is None:
             return None
-        
-        base_weight = self.edges[from_city][to_city]
-        traffic_delta = self.traffic_map.get((from_city, to_city), 0)
-        return max(1, base_weight + traffic_delta)
+        return self.effective_weights[k]
     
-    def dijkstra(self, start: str, end: str) -> Tuple[List[str], int]:
-        """Find shortest path using Dijkstra's algorithm with heap."""
+    def dijkstra(self, start: str, end: str,
+                 landmarks: Optional[List[str]] = None) -> Tuple[List[str], int]:
+        """Find shortest path using Dijkstra's algorithm, or A* when landmarks are given."""
         if start not in self.nodes or end not in self.nodes:
             return [], float('inf')
         
-        """Create priority queue for vertices being preprocessed."""
-        pq = [(0, start, [start])]
-        visited = set()
-        """Create list of distances initialized as 0."""
-        distances = {start: 0}
+        self._refresh_csr()
+        source, target = self.city_id[start], self.city_id[end]
+        if landmarks:
+            distances, parent = _astar_csr(self.indptr, self.csr_neighbors,
+                                           self.effective_weights, source, target,
+                                           len(self.city_names),
+                                           self.landmark_distances(end, landmarks))
+        else:
+            distances, parent = _dijkstra_csr(self.indptr, self.csr_neighbors,
+                                              self.effective_weights, source, target,
+                                              len(self.city_names))
+        return self._trace_path(distances, parent, target)
+    
+    def choose_landmarks(self, count: int) -> List[str]:
+        """Pick up to count landmark cities, each farthest from the previous one."""
+        self._refresh_csr()
+        if not self.city_names:
+            return []
+        
+        landmarks = [self.city_names[0]]
+        while len(landmarks) < count:
+            distances, _ = self.shortest_path_tree(landmarks[-1])
+            farthest = max(range(len(distances)), key=distances.__getitem__)
+            city = self.city_names[farthest]
+            if distances[farthest] <= 0 or city in landmarks:
+                break
+            landmarks.append(city)
+        return landmarks
+    
+    def landmark_distances(self, end: str,
+                           landmarks: List[str]) -> List[Tuple[List[int], int]]:
+        """(distances, distance to end) per known landmark that can reach end.
 
-        """Loop while priority queue is not yet empty."""
-        while pq:
-            current_cost, current_city, path = heapq.heappop(pq)
-            
-            if current_city in visited:
+        For a landmark l, d(l, end) <= d(l, v) + d(v, end), so
+        d(l, end) - d(l, v) never overestimates the remaining cost from v;
+        _astar_csr turns these into bounds for the cities it visits.
+        Landmark trees come from shortest_path_tree and so are reused until
+        the weights change.
+        """
+        self._refresh_csr()
+        target = self.city_id[end]
+        landmark_dists = []
+        for landmark in landmarks:
+            if landmark not in self.city_id:
                 continue
-                
-            visited.add(current_city)
-            
-            if current_city == end:
-                return path, current_cost
-            
-            for neighbor in self.edges.get(current_city, {}):
-                if neighbor in visited:
-                    continue
-                
-                effective_weight = self.get_effective_weight(current_city, neighbor)
-                if effective_weight is None:
-                    continue
-                
-                new_cost = current_cost + effective_weight
+            distances, _ = self.shortest_path_tree(landmark)
+            if distances[target] >= 0:
+                landmark_dists.append((distances, distances[target]))
+        return landmark_dists
+    
+    def shortest_path_tree(self, start: str) -> Tuple[List[int], List[int]]:
+        """Run Dijkstra from start to every city and return (distances, parent).
 
-                """If a shorter path exists..."""
-                if neighbor not in distances or new_cost < distances[neighbor]:
-                    """Update the distance."""
-                    distances[neighbor] = new_cost
-                    new_path = path + [neighbor]
-                    heapq.heappush(pq, (new_cost, neighbor, new_path))
+        The result is cached per start city until edge weights change, so
+        several queries from the same city share one search.
+        """
+        self._refresh_csr()
+        source = self.city_id[start]
+        tree = self._sssp_cache.get(source)
+        if tree is None:
+            tree = _dijkstra_csr(self.indptr, self.csr_neighbors, self.effective_weights,
+                                 source, -1, len(self.city_names))
+            self._sssp_cache[source] = tree
+        return tree
+    
+    def release_shortest_path_tree(self, start: str) -> None:
+        """Drop the cached tree for start; a later query from it searches again."""
+        source = self.city_id.get(start)
+        if source is not None:
+            self._sssp_cache.pop(source, None)
+    
+    def tree_shortest_path(self, start: str, end: str) -> Tuple[List[str], int]:
+        """Same answer as dijkstra, read from the cached tree for start."""
+        if start not in self.nodes or end not in self.nodes:
+            return [], float('inf')
         
-        return [], float('inf')
+        distances, parent = self.shortest_path_tree(start)
+        return self._trace_path(distances, parent, self.city_id[end])
+    
+    def _trace_path(self, distances: List[int], parent: List[int],
+                    target: int) -> Tuple[List[str], int]:
+        """Walk parent links back from target into a list of city names."""
+        if distances[target] < 0:
+            return [], float('inf')
+        
+        path = []
+        node = target
+        while node != -1:
+            path.append(self.city_names[node])
+            node = parent[node]
+        path.reverse()
+        return path, distances[target]
     
     def find_k_paths(self, start: str, end: str, k: int) -> List[Tuple[List[str], int]]:
         """Find K shortest paths using modified Dijkstra's algorithm."""
         if start not in self.nodes or end not in self.nodes:
             return []
         
-        pq = [(0, start, [start], {start})]
+        self._refresh_csr()
+        indptr, neighbors = self.indptr, self.csr_neighbors
+        edge_weights = self.effective_weights
+        source, target = self.city_id[start], self.city_id[end]
+        
+        # on small graphs bit i of mask is set when city id i is already on
+        # the path; larger graphs walk the path's parent keys instead
+        use_mask = len(self.city_names) <= 63
+        # a path is only turned into city names once it reaches end
+        pq = [(0, source, _PathKey(source, None), 1 << source if use_mask else 0)]
         paths_found = []
-        visited_count = defaultdict(int)
         
         while pq and len(paths_found) < k:
-            current_cost, current_city, path, visited = heapq.heappop(pq)
-            
-            if visited_count[current_city] >= k:
-                continue
+            current_cost, u, key, mask = heapq.heappop(pq)
             
-            if current_city == end:
+            if u == target:
+                path = [self.city_names[node] for node in key.ids()]
                 paths_found.append((path, current_cost))
-                visited_count[current_city] += 1
                 continue
             
-            for neighbor in self.edges.get(current_city, {}):
-                if neighbor in visited:
-                    continue
+            for e in range(indptr[u], indptr[u + 1]):
+                v = neighbors[e]
+                if use_mask:
+                    bit = 1 << v
+                    if mask & bit:
+                        continue
+                    new_mask = mask | bit
+                else:
+                    on_path = key
+                    while on_path is not None and on_path.node != v:
+                        on_path = on_path.parent
+                    if on_path is not None:
+                        continue
+                    new_mask = 0
                 
-                effective_weight = self.get_effective_weight(current_city, neighbor)
-                if effective_weight is None:
-                    continue
-                
-                new_cost = current_cost + effective_weight
-                new_path = path + [neighbor]
-                new_visited = visited | {neighbor}
-                
-                heapq.heappush(pq, (new_cost, neighbor, new_path, new_visited))
+                new_cost = current_cost + edge_weights[e]
+                heapq.heappush(pq, (new_cost, v, _PathKey(v, key), new_mask))
         
         return paths_found
 
 
-def parse_traffic_report(line: str) -> Tuple[str, str, int]:
-    """Parse traffic report line."""
-    parts = line.split()
+def parse_traffic_report(parts: List[str]) -> Tuple[str, str, int]:
+    """Parse the tokens of a traffic report line."""
     if len(parts) != 4 or parts[0] != "TRAFFIC_REPORT":
-        raise ValueError(f"Invalid traffic report format: {line}")
-    
-    from_city, to_city, delta_str = parts[1], parts[2], parts[3]
-    
-    if delta_str.startswith('+'):
-        delta = int(delta_str[1:])
-    elif delta_str.startswith('-'):
-        delta = -int(delta_str[1:])
-    else:
-        delta = int(delta_str)
+        raise ValueError(f"Invalid traffic report format: {' '.join(parts)}")
     
-    return from_city, to_city, delta
+    # int() accepts the optional '+'/'-' sign directly
+    return parts[1], parts[2], int(parts[3])
 
 
-def parse_query(line: str) -> Tuple[str, ...]:
-    """Parse query line."""
-    parts = line.split()
+def parse_query(parts: List[str]) -> Tuple[str, ...]:
+    """Parse the tokens of a query line."""
     if len(parts) < 2 or parts[0] != "QUERY":
-        raise ValueError(f"Invalid query format: {line}")
+        raise ValueError(f"Invalid query format: {' '.join(parts)}")
     
     query_type = parts[1]
     
     if query_type == "SHORTEST_PATH":
         if len(parts) != 4:
-            raise ValueError(f"SHORTEST_PATH requires 2 cities: {line}")
+            raise ValueError(f"SHORTEST_PATH requires 2 cities: {' '.join(parts)}")
         return ("SHORTEST_PATH", parts[2], parts[3])
     
     elif query_type == "K_PATHS":
         if len(parts) != 5:
-            raise ValueError(f"K_PATHS requires 2 cities and K value: {line}")
+            raise ValueError(f"K_PATHS requires 2 cities and K value: {' '.join(parts)}")
         return ("K_PATHS", parts[2], parts[3], int(parts[4]))
     
     else:
@@ -168,6 +451,29 @@ def format_k_path(path: List[str], cost: int) -> str:
     return f"{' -> '.join(path)} ({cost})"
 
 
+def find_batched_queries(commands: List[Tuple[int, List[str]]]) -> Dict[int, bool]:
+    """Find SHORTEST_PATH queries that can share a shortest-path tree.
+
+    Returns the indices into commands of queries whose start city is queried
+    again before the next traffic report. Weights cannot change in between,
+    so one full Dijkstra from that city answers all of them. Each index maps
+    to True if it is the last query of its run, after which the tree can be
+    released.
+    """
+    batched = {}
+    run_sources: Dict[str, List[int]] = {}
+    for index, (_, parts) in enumerate(commands):
+        if parts[0].startswith("TRAFFIC_REPORT"):
+            run_sources = {}
+        elif len(parts) == 4 and parts[0] == "QUERY" and parts[1] == "SHORTEST_PATH":
+            indices = run_sources.setdefault(parts[2], [])
+            indices.append(index)
+            if len(indices) > 1:
+                batched[indices[-2]] = False
+                batched[index] = True
+    return batched
+
+
 def process_commands(graph: TrafficGraph, commands_file: str) -> None:
     """Process commands from file."""
     try:
@@ -180,23 +486,36 @@ def process_commands(graph: TrafficGraph, commands_file: str) -> None:
         print(f"Error reading file '{commands_file}': {e}", file=sys.stderr)
         sys.exit(1)
     
+    commands = []
     for line_num, line in enumerate(lines, 1):
         line = line.strip()
         
         if not line or line.startswith('#'):
             continue
         
+        commands.append((line_num, line.split()))
+    
+    batched = find_batched_queries(commands)
+    
+    for index, (line_num, parts) in enumerate(commands):
+        command = parts[0]
+        
         try:
-            if line.startswith("TRAFFIC_REPORT"):
-                from_city, to_city, delta = parse_traffic_report(line)
+            if command.startswith("TRAFFIC_REPORT"):
+                from_city, to_city, delta = parse_traffic_report(parts)
                 graph.apply_traffic_report(from_city, to_city, delta)
             
-            elif line.startswith("QUERY"):
-                query_parts = parse_query(line)
+            elif command.startswith("QUERY"):
+                query_parts = parse_query(parts)
                 
                 if query_parts[0] == "SHORTEST_PATH":
                     start, end = query_parts[1], query_parts[2]
-                    path, cost = graph.dijkstra(start, end)
+                    if index in batched:
+                        path, cost = graph.tree_shortest_path(start, end)
+                        if batched[index]:
+                            graph.release_shortest_path_tree(start)
+                    else:
+                        path, cost = graph.dijkstra(start, end)
                     
                     if path:
                         print(f"SHORTEST_PATH {start} {end}: {format_path(path, cost)}")
@@ -228,11 +547,7 @@ def main():
     graph_file, commands_file = sys.argv[1], sys.argv[2]
     
     try:
-        base_graph, input_cities = parse_input_to_graph(graph_file)
-        
-        traffic_graph = TrafficGraph()
-        traffic_graph.nodes = base_graph.nodes
-        traffic_graph.edges = base_graph.edges
+        traffic_graph, input_cities = parse_input_to_graph(graph_file, graph_cls=TrafficGraph)
         
         process_commands(traffic_graph, commands_file)
         
@@ -1,14 +1,26 @@
 #!/usr/bin/env python3
 """Unit tests for Transport Network Graph Builder."""
 
+import sys
 import unittest
 import tempfile
 import os
-from graph_builder1 import Graph, validate_weight, find_city_split, parse_input_to_graph
+import io
+import json
+import time
+import contextlib
+from array import array
+from graph_builder4 import (Graph, validate_weight, build_city_trie, find_city_split,
+                            parse_input_to_graph, parse_input_to_graph_cached,
+                            parse_input_to_graph_from_str,
+                            _parse_path_cached, _split_cached)
+from graph_query4 import TrafficGraph, find_batched_queries, process_commands
 
+HERE = os.path.dirname(os.path.abspath(__file__))
 
-class TestGraph(unittest.TestCase):
-    """Test cases for Graph class."""
+
+class TestGraphMutating(unittest.TestCase):
+    """Test cases for Graph methods that build or change a graph."""
     
     def setUp(self):
         """Set up test fixtures."""
@@ -21,6 +33,22 @@ class TestGraph(unittest.TestCase):
         self.assertIn("City1", self.graph.edges)
         self.assertEqual(self.graph.edges["City1"], {})
     
+    def test_add_node_defers_adjacency(self):
+        """Test that adjacency lists are only allocated by connect."""
+        self.graph.add_node("City1")
+        self.graph.add_node("City2")
+        self.assertIs(self.graph.neighbors[0], self.graph.neighbors[1])
+        
+        self.graph.connect("City1", "City2", 5)
+        self.assertEqual(self.graph.neighbors[0], [1])
+        self.assertEqual(self.graph.neighbors[1], ())
+    
+    def test_graph_uses_slots(self):
+        """Test that Graph instances carry no per-instance __dict__."""
+        self.assertFalse(hasattr(self.graph, '__dict__'))
+        with self.assertRaises(AttributeError):
+            self.graph.extra = 1
+    
     def test_connect(self):
         """Test connecting cities with roads."""
         self.graph.add_node("City1")
@@ -30,6 +58,26 @@ class TestGraph(unittest.TestCase):
         self.assertIn("City2", self.graph.edges["City1"])
         self.assertEqual(self.graph.edges["City1"]["City2"], 5)
     
+    def test_connect_weight_storage(self):
+        """Test that weights are stored in a compact int array."""
+        self.graph.connect("City1", "City2", 5)
+        self.graph.connect("City1", "City3", 7)
+        
+        weights = self.graph.weights[self.graph.node_id["City1"]]
+        self.assertIsInstance(weights, array)
+        self.assertEqual(list(weights), [5, 7])
+    
+    def test_connect_weight_beyond_int64(self):
+        """Test that weights too large for the int array are still kept."""
+        big = 2 ** 63
+        self.graph.connect("City1", "City2", 5)
+        self.graph.connect("City1", "City3", big)
+        self.graph.connect("City1", "City2", big + 1)
+        
+        self.assertEqual(self.graph.edges["City1"], {"City2": big + 1, "City3": big})
+        self.assertEqual(self.graph.to_adjacency_lines(["City1"]),
+                         [f"City1: City2({big + 1}), City3({big})"])
+    
     def test_connect_auto_add_node(self):
         """Test that connect automatically adds missing nodes."""
         self.graph.connect("City1", "City2", 3)
@@ -45,9 +93,32 @@ class TestGraph(unittest.TestCase):
         self.graph.connect("City2", "City1", 3)
         
         self.graph.remove_node("City1")
-        self.assertNotIn("City1", self.graph.nodes)
-        self.assertNotIn("City1", self.graph.edges)
-        self.assertNotIn("City1", self.graph.edges["City2"])
+        self.assertEqual(set(self.graph.nodes), {"City2"})
+        self.assertEqual(self.graph.edges, {"City2": {}})
+    
+    def test_remove_node_reindexes(self):
+        """Test that ids stay consistent after removing a node."""
+        self.graph.connect("City1", "City2", 5)
+        self.graph.connect("City2", "City3", 2)
+        self.graph.connect("City3", "City1", 3)
+        
+        self.graph.remove_node("City2")
+        self.assertEqual(self.graph.node_id, {"City1": 0, "City3": 1})
+        self.assertEqual(self.graph.edges["City3"]["City1"], 3)
+        self.assertEqual(self.graph.to_adjacency_lines(["City1", "City3"]),
+                         ["City1:", "City3: City1(3)"])
+    
+    def test_remove_node_moves_last_id(self):
+        """Test that the last node takes the removed id and keeps its roads."""
+        self.graph.connect("City1", "City3", 4)
+        self.graph.connect("City2", "City1", 2)
+        self.graph.connect("City3", "City2", 1)
+        self.graph.connect("City2", "City3", 6)
+        
+        self.graph.remove_node("City1")
+        self.assertEqual(self.graph.node_id, {"City3": 1, "City2": 0})
+        self.assertEqual(list(self.graph.edges), ["City3", "City2"])
+        self.assertEqual(self.graph.edges, {"City2": {"City3": 6}, "City3": {"City2": 1}})
     
     def test_remove_edge(self):
         """Test removing specific edges."""
@@ -55,17 +126,36 @@ class TestGraph(unittest.TestCase):
         self.graph.connect("City1", "City3", 3)
         
         self.graph.remove_edge("City1", "City2")
-        self.assertNotIn("City2", self.graph.edges["City1"])
-        self.assertIn("City3", self.graph.edges["City1"])
+        self.assertEqual(self.graph.edges["City1"], {"City3": 3})
     
-    def test_to_adjacency_lines(self):
-        """Test adjacency list output format."""
+    def test_remove_edge_then_overwrite(self):
+        """Test that roads after a removed one are still found in place."""
         self.graph.connect("City1", "City2", 5)
         self.graph.connect("City1", "City3", 3)
-        self.graph.connect("City2", "City3", 2)
+        self.graph.connect("City1", "City4", 4)
         
-        input_cities = ["City1", "City2", "City3"]
-        lines = self.graph.to_adjacency_lines(input_cities)
+        self.graph.remove_edge("City1", "City2")
+        self.graph.connect("City1", "City4", 9)
+        self.assertEqual(self.graph.edges["City1"], {"City3": 3, "City4": 9})
+        self.assertEqual(self.graph.to_adjacency_lines(["City1"]),
+                         ["City1: City3(3), City4(9)"])
+
+
+class TestGraphReadOnly(unittest.TestCase):
+    """Test cases for Graph output that share one graph."""
+    
+    @classmethod
+    def setUpClass(cls):
+        """Build the shared graph once; tests must not mutate it."""
+        cls.graph = Graph()
+        cls.graph.connect("City1", "City2", 5)
+        cls.graph.connect("City1", "City3", 3)
+        cls.graph.connect("City2", "City3", 2)
+        cls.input_cities = ["City1", "City2", "City3"]
+    
+    def test_to_adjacency_lines(self):
+        """Test adjacency list output format."""
+        lines = self.graph.to_adjacency_lines(self.input_cities)
         
         expected = [
             "City1: City2(5), City3(3)",
@@ -76,37 +166,34 @@ class TestGraph(unittest.TestCase):
     
     def test_to_json(self):
         """Test JSON output format."""
-        self.graph.connect("City1", "City2", 5)
-        self.graph.connect("City2", "City3", 3)
-        
-        input_cities = ["City1", "City2", "City3"]
-        json_str = self.graph.to_json(input_cities)
+        json_str = self.graph.to_json(self.input_cities)
         
         expected = {
-            "City1": {"City2": 5},
-            "City2": {"City3": 3},
+            "City1": {"City2": 5, "City3": 3},
+            "City2": {"City3": 2},
             "City3": {}
         }
-        self.assertEqual(eval(json_str), expected)
+        self.assertEqual(json.loads(json_str), expected)
 
 
 class TestValidation(unittest.TestCase):
     """Test cases for validation functions."""
     
-    def test_validate_weight_valid(self):
-        """Test valid weight validation."""
-        weight = validate_weight("5", 1)
-        self.assertEqual(weight, 5)
+    def split_with_trie(self, tokens, valid_cities):
+        """Split tokens against a trie built once from valid_cities."""
+        trie = build_city_trie(valid_cities)
+        return find_city_split(tokens, valid_cities, trie)
     
-    def test_validate_weight_negative(self):
-        """Test negative weight validation."""
-        with self.assertRaises(SystemExit):
-            validate_weight("-1", 1)
-    
-    def test_validate_weight_invalid(self):
-        """Test invalid weight validation."""
-        with self.assertRaises(SystemExit):
-            validate_weight("abc", 1)
+    def test_validate_weight(self):
+        """Test weight validation for valid, negative and non-numeric input."""
+        cases = [("5", 5), ("1_000", 1000), (" 7", 7), ("-1", SystemExit), ("abc", SystemExit)]
+        for weight_str, expected in cases:
+            with self.subTest(weight=weight_str):
+                if expected is SystemExit:
+                    with self.assertRaises(SystemExit):
+                        validate_weight(weight_str, 1)
+                else:
+                    self.assertEqual(validate_weight(weight_str, 1), expected)
     
     def test_find_city_split_simple(self):
         """Test simple city name splitting."""
@@ -122,48 +209,106 @@ class TestValidation(unittest.TestCase):
         tokens = ["New", "York", "Los", "Angeles"]
         valid_cities = {"New York", "Los Angeles"}
         
-        city1, city2 = find_city_split(tokens, valid_cities)
+        city1, city2 = self.split_with_trie(tokens, valid_cities)
         self.assertEqual(city1, "New York")
         self.assertEqual(city2, "Los Angeles")
     
+    def test_find_city_split_shared_prefix(self):
+        """Test splitting when one city name is a prefix of another."""
+        tokens = ["New", "York", "City", "Boston"]
+        valid_cities = {"New York", "New York City", "Boston"}
+        
+        city1, city2 = self.split_with_trie(tokens, valid_cities)
+        self.assertEqual(city1, "New York City")
+        self.assertEqual(city2, "Boston")
+    
+    def test_build_city_trie(self):
+        """Test trie layout for multi-word city names."""
+        trie = build_city_trie(["New York", "New Haven", "Boston"])
+        
+        self.assertEqual(trie["New"]["York"][None], "New York")
+        self.assertEqual(trie["New"]["Haven"][None], "New Haven")
+        self.assertEqual(trie["Boston"][None], "Boston")
+        self.assertNotIn(None, trie["New"])
+    
     def test_find_city_split_not_found(self):
         """Test city split when cities not found."""
         tokens = ["City1", "City2"]
         valid_cities = {"City3", "City4"}
         
-        city1, city2 = find_city_split(tokens, valid_cities)
+        city1, city2 = self.split_with_trie(tokens, valid_cities)
         self.assertIsNone(city1)
         self.assertIsNone(city2)
+    
+    def test_find_city_split_memoized(self):
+        """Test that repeated splits against a frozenset are served from the cache."""
+        tokens = ["City1", "City2"]
+        valid_cities = frozenset({"City1", "City2"})
+        
+        _split_cached.cache_clear()
+        find_city_split(tokens, valid_cities)
+        city1, city2 = find_city_split(tokens, valid_cities)
+        self.assertEqual((city1, city2), ("City1", "City2"))
+        self.assertGreater(_split_cached.cache_info().hits, 0)
+    
+    def test_find_city_split_after_mutation(self):
+        """Test that a set mutated in place between calls is seen as it is now."""
+        valid_cities = {"A", "B"}
+        self.assertEqual(find_city_split(["A", "C"], valid_cities), (None, None))
+        
+        valid_cities.discard("B")
+        valid_cities.add("C")
+        self.assertEqual(find_city_split(["A", "C"], valid_cities), ("A", "C"))
 
 
 class TestParsing(unittest.TestCase):
     """Test cases for file parsing."""
     
-    def create_temp_file(self, content):
-        """Create a temporary file with given content."""
-        temp_file = tempfile.NamedTemporaryFile(mode='w', delete=False)
-        temp_file.write(content)
-        temp_file.close()
-        return temp_file.name
+    @classmethod
+    def setUpClass(cls):
+        """Create one temporary directory for the path-based tests."""
+        cls._tmpdir = tempfile.TemporaryDirectory()
+    
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the temporary directory."""
+        cls._tmpdir.cleanup()
+    
+    def setUp(self):
+        """Start each test with no temporary files."""
+        self._temps = []
     
     def tearDown(self):
-        """Clean up temporary files."""
-        for attr in dir(self):
-            if attr.startswith('temp_file_'):
-                file_path = getattr(self, attr)
-                if os.path.exists(file_path):
-                    os.unlink(file_path)
+        """Remove the files this test created."""
+        for path in self._temps:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        self._temps.clear()
+    
+    def create_temp_file(self, content):
+        """Write content to a uniquely named file in the class temporary directory."""
+        fd, path = tempfile.mkstemp(dir=self._tmpdir.name)
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        self._temps.append(path)
+        return path
+    
+    def age_file(self, path, seconds=60):
+        """Move a file's timestamps into the past, out of the racy window."""
+        past = time.time_ns() - seconds * 10 ** 9
+        os.utime(path, ns=(past, past))
     
     def test_parse_simple_input(self):
-        """Test parsing simple input file."""
+        """Test parsing simple input from a file-like object."""
         content = """CITIES
 City1
 City2
 ROADS
 City1 City2 5"""
         
-        self.temp_file_1 = self.create_temp_file(content)
-        graph, input_cities = parse_input_to_graph(self.temp_file_1)
+        graph, input_cities = parse_input_to_graph(io.StringIO(content))
         
         self.assertEqual(input_cities, ["City1", "City2"])
         self.assertIn("City1", graph.nodes)
@@ -178,12 +323,34 @@ Los Angeles
 ROADS
 New York Los Angeles 3000"""
         
-        self.temp_file_2 = self.create_temp_file(content)
-        graph, input_cities = parse_input_to_graph(self.temp_file_2)
+        graph, input_cities = parse_input_to_graph_from_str(content)
         
         self.assertEqual(input_cities, ["New York", "Los Angeles"])
         self.assertEqual(graph.edges["New York"]["Los Angeles"], 3000)
     
+    def test_parse_unicode_whitespace(self):
+        """Test that non-ASCII whitespace is stripped and splits road tokens."""
+        content = "CITIES\n\u00a0City1\u00a0\nNew York\nROADS\nCity1\u2003New York\u20037\n"
+        
+        graph, input_cities = parse_input_to_graph_from_str(content)
+        
+        self.assertEqual(input_cities, ["City1", "New York"])
+        self.assertEqual(graph.edges["City1"]["New York"], 7)
+    
+    def test_parse_interns_city_names(self):
+        """Test that parsed city names are interned and shared."""
+        content = """CITIES
+New York
+Boston
+ROADS
+New York Boston 200"""
+        
+        graph, input_cities = parse_input_to_graph_from_str(content)
+        
+        self.assertIs(input_cities[0], sys.intern("New York"))
+        self.assertIs(graph.names[0], input_cities[0])
+        self.assertIs(graph.names[graph.neighbors[0][0]], input_cities[1])
+    
     def test_parse_duplicate_city(self):
         """Test parsing with duplicate city names."""
         content = """CITIES
@@ -191,9 +358,8 @@ City1
 City1
 ROADS"""
         
-        self.temp_file_3 = self.create_temp_file(content)
         with self.assertRaises(SystemExit):
-            parse_input_to_graph(self.temp_file_3)
+            parse_input_to_graph_from_str(content)
     
     def test_parse_invalid_road_format(self):
         """Test parsing with invalid road format."""
@@ -203,9 +369,8 @@ City2
 ROADS
 City1 City2"""
         
-        self.temp_file_4 = self.create_temp_file(content)
         with self.assertRaises(SystemExit):
-            parse_input_to_graph(self.temp_file_4)
+            parse_input_to_graph_from_str(content)
     
     def test_parse_negative_weight(self):
         """Test parsing with negative weight."""
@@ -215,10 +380,337 @@ City2
 ROADS
 City1 City2 -5"""
         
-        self.temp_file_5 = self.create_temp_file(content)
         with self.assertRaises(SystemExit):
-            parse_input_to_graph(self.temp_file_5)
+            parse_input_to_graph_from_str(content)
+    
+    def test_parse_from_path(self):
+        """Test parsing a file given by path."""
+        content = """CITIES
+City1
+City2
+ROADS
+City1 City2 5
+"""
+        
+        _parse_path_cached.cache_clear()
+        graph, input_cities = parse_input_to_graph(self.create_temp_file(content))
+        
+        self.assertEqual(input_cities, ["City1", "City2"])
+        self.assertEqual(graph.edges["City1"]["City2"], 5)
+        self.assertEqual(_parse_path_cached.cache_info().currsize, 0)
+    
+    def test_parse_path_is_cached(self):
+        """Test that re-parsing an unchanged file reuses the cached result."""
+        path = self.create_temp_file("CITIES\nCity1\nCity2\nROADS\nCity1 City2 5\n")
+        self.age_file(path)
+        
+        _parse_path_cached.cache_clear()
+        graph1, _ = parse_input_to_graph_cached(path)
+        graph1.connect("City2", "City1", 3)
+        graph2, input_cities = parse_input_to_graph_cached(path)
+        
+        self.assertEqual(_parse_path_cached.cache_info().hits, 1)
+        self.assertEqual(input_cities, ["City1", "City2"])
+        self.assertNotIn("City1", graph2.edges["City2"])
+    
+    def test_parse_path_cache_sees_replaced_file(self):
+        """Test that a same-size file swapped in with equal timestamps is re-read."""
+        path = self.create_temp_file("CITIES\nCity1\nCity2\nROADS\nCity1 City2 5\n")
+        self.age_file(path)
+        graph1, _ = parse_input_to_graph_cached(path)
+        
+        stat = os.stat(path)
+        replacement = self.create_temp_file("CITIES\nCity1\nCity2\nROADS\nCity1 City2 7\n")
+        os.utime(replacement, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(replacement, path)
+        graph2, _ = parse_input_to_graph_cached(path)
+        
+        self.assertEqual(graph1.edges["City1"]["City2"], 5)
+        self.assertEqual(graph2.edges["City1"]["City2"], 7)
+    
+    def test_parse_path_recent_rewrite_not_cached(self):
+        """Test that a file rewritten just now is parsed afresh."""
+        path = self.create_temp_file("CITIES\nCity1\nCity2\nROADS\nCity1 City2 5\n")
+        graph1, _ = parse_input_to_graph_cached(path)
+        with open(path, 'w') as f:
+            f.write("CITIES\nCity1\nCity2\nROADS\nCity1 City2 7\n")
+        graph2, _ = parse_input_to_graph_cached(path)
+        
+        self.assertEqual(graph1.edges["City1"]["City2"], 5)
+        self.assertEqual(graph2.edges["City1"]["City2"], 7)
+    
+    def test_parse_relative_path_cached_by_real_path(self):
+        """Test that a relative path is cached under the file it resolves to."""
+        path = self.create_temp_file("CITIES\nCity1\nCity2\nROADS\nCity1 City2 5\n")
+        self.age_file(path)
+        cwd = os.getcwd()
+        os.chdir(self._tmpdir.name)
+        try:
+            _parse_path_cached.cache_clear()
+            parse_input_to_graph_cached(path)
+            parse_input_to_graph_cached(os.path.basename(path))
+        finally:
+            os.chdir(cwd)
+        
+        self.assertEqual(_parse_path_cached.cache_info().hits, 1)
+    
+    def test_parse_invalid_utf8(self):
+        """Test that a file that is not valid UTF-8 exits with a read error."""
+        path = self.create_temp_file("")
+        with open(path, 'wb') as f:
+            f.write(b"CITIES\nCity\xff1\nROADS\n")
+        
+        with self.assertRaises(SystemExit):
+            parse_input_to_graph(path)
+    
+    def test_parse_empty_file(self):
+        """Test parsing an empty file given by path."""
+        with self.assertRaises(SystemExit):
+            parse_input_to_graph(self.create_temp_file(""))
 
 
-if __name__ == '__main__':
-    unittest.main() 
\ No newline at end of file
+class TestQueries(unittest.TestCase):
+    """Test cases for the traffic query system."""
+    
+    def run_commands(self, graph_file, commands_file):
+        """Run a commands file against a graph file and return stdout lines."""
+        graph, _ = parse_input_to_graph(graph_file, graph_cls=TrafficGraph)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            process_commands(graph, commands_file)
+        return out.getvalue().splitlines()
+    
+    def test_k_paths_sample_output(self):
+        """Test K_PATHS routes and their order on the shipped sample."""
+        lines = self.run_commands(os.path.join(HERE, "input1.txt"),
+                                  os.path.join(HERE, "commands2.txt"))
+        k_path_lines = [line for line in lines if not line.startswith("SHORTEST_PATH")]
+        
+        expected = """K_PATHS City85 City72:
+1) City85 -> City86 -> City62 -> City51 -> City42 -> City31 -> City54 -> City72 (15)
+2) City85 -> City50 -> City51 -> City42 -> City31 -> City54 -> City72 (16)
+3) City85 -> City86 -> City34 -> City72 (16)
+4) City85 -> City61 -> City62 -> City51 -> City42 -> City31 -> City54 -> City72 (17)
+K_PATHS City18 City73:
+1) City18 -> City19 -> City31 -> City96 -> City73 (16)
+2) City18 -> City11 -> City94 -> City37 -> City73 (18)
+K_PATHS City78 City80:
+1) City78 -> City79 -> City80 (7)
+2) City78 -> City79 -> City50 -> City51 -> City80 (14)
+3) City78 -> City79 -> City50 -> City12 -> City13 -> City80 (15)
+4) City78 -> City79 -> City50 -> City51 -> City13 -> City80 (15)
+K_PATHS City65 City92:
+1) City65 -> City41 -> City92 (11)
+2) City65 -> City66 -> City67 -> City68 -> City11 -> City92 (16)
+3) City65 -> City66 -> City67 -> City68 -> City11 -> City12 -> City13 -> City92 (20)
+4) City65 -> City47 -> City68 -> City11 -> City92 (21)
+K_PATHS City82 City77:
+1) City82 -> City7 -> City14 -> City36 -> City37 -> City73 -> City77 (21)
+2) City82 -> City83 -> City96 -> City73 -> City77 (21)
+3) City82 -> City47 -> City77 (23)
+4) City82 -> City7 -> City14 -> City98 -> City10 -> City77 (26)
+K_PATHS City75 City15:
+1) City75 -> City39 -> City40 -> City15 (20)
+2) City75 -> City39 -> City7 -> City14 -> City15 (23)
+K_PATHS City45 City94:
+1) City45 -> City93 -> City94 (6)
+2) City45 -> City46 -> City47 -> City68 -> City11 -> City94 (11)
+3) City45 -> City93 -> City9 -> City10 -> City11 -> City94 (14)
+4) City45 -> City46 -> City47 -> City68 -> City11 -> City92 -> City93 -> City94 (22)
+K_PATHS City55 City32:
+1) City55 -> City64 -> City65 -> City66 -> City32 (20)
+2) City55 -> City18 -> City19 -> City31 -> City32 (21)
+K_PATHS City64 City29:
+1) City64 -> City45 -> City93 -> City9 -> City10 -> City29 (19)
+2) City64 -> City65 -> City44 -> City28 -> City29 (19)
+K_PATHS City9 City48:
+1) City9 -> City10 -> City29 -> City65 -> City48 (11)
+2) City9 -> City10 -> City29 -> City62 -> City63 -> City64 -> City65 -> City48 (18)
+K_PATHS City59 City14:
+1) City59 -> City62 -> City51 -> City13 -> City14 (19)
+2) City59 -> City60 -> City61 -> City62 -> City51 -> City13 -> City14 (20)
+3) City59 -> City62 -> City9 -> City88 -> City32 -> City53 -> City14 (22)
+4) City59 -> City38 -> City39 -> City7 -> City14 (23)
+K_PATHS City88 City1:
+1) City88 -> City89 -> City34 -> City72 -> City0 -> City1 (15)
+2) City88 -> City89 -> City0 -> City1 (18)
+3) City88 -> City89 -> City34 -> City72 -> City57 -> City1 (18)
+K_PATHS City54 City46:
+1) City54 -> City72 -> City0 -> City62 -> City51 -> City42 -> City31 -> City96 -> City45 -> City46 (21)
+2) City54 -> City72 -> City57 -> City6 -> City32 -> City53 -> City46 (21)
+3) City54 -> City72 -> City32 -> City53 -> City46 (22)
+K_PATHS City55 City1:
+1) City55 -> City97 -> City1 (20)
+2) City55 -> City18 -> City84 -> City1 (23)
+3) City55 -> City18 -> City19 -> City1 (24)
+K_PATHS City70 City55:
+1) City70 -> City42 -> City31 -> City55 (10)
+2) City70 -> City42 -> City31 -> City54 -> City55 (14)
+K_PATHS City40 City74:
+1) City40 -> City74 (7)
+2) City40 -> City41 -> City92 -> City22 -> City44 -> City74 (16)
+K_PATHS City28 City36:
+1) City28 -> City72 -> City73 -> City89 -> City3 -> City35 -> City36 (23)
+2) City28 -> City57 -> City6 -> City32 -> City53 -> City14 -> City36 (24)
+3) City28 -> City29 -> City62 -> City51 -> City13 -> City14 -> City36 (25)
+4) City28 -> City57 -> City6 -> City39 -> City7 -> City14 -> City36 (25)
+K_PATHS City87 City20:
+1) City87 -> City80 -> City30 -> City20 (16)
+2) City87 -> City88 -> City30 -> City20 (22)
+3) City87 -> City80 -> City81 -> City30 -> City20 (24)
+4) City87 -> City90 -> City91 -> City20 (24)
+K_PATHS City7 City75:
+1) City7 -> City14 -> City98 -> City60 -> City74 -> City75 (19)
+2) City7 -> City14 -> City98 -> City4 -> City5 -> City21 -> City22 -> City44 -> City74 -> City75 (20)
+3) City7 -> City23 -> City24 -> City60 -> City74 -> City75 (21)
+K_PATHS City94 City4:
+1) City94 -> City37 -> City73 -> City89 -> City3 -> City4 (13)
+2) City94 -> City39 -> City98 -> City4 (15)"""
+        self.assertEqual(k_path_lines, expected.splitlines())
+    
+    def test_k_paths_small_and_large_graphs_agree(self):
+        """Test that the bitmask and parent-walk cycle checks give the same paths."""
+        small = TrafficGraph()
+        for i in range(8):
+            for step, weight in [(1, 1), (3, 2), (5, 4)]:
+                small.connect(f"C{i}", f"C{(i + step) % 8}", weight)
+        large = small.copy()
+        for i in range(64):
+            large.add_node(f"Z{i}")
+        
+        for end in ["C3", "C6"]:
+            paths = small.find_k_paths("C0", end, 6)
+            self.assertEqual(len(paths), 6)
+            self.assertEqual(large.find_k_paths("C0", end, 6), paths)
+    
+    def test_find_batched_queries(self):
+        """Test which queries share a tree and which one releases it."""
+        commands = [(n, line.split()) for n, line in enumerate([
+            "QUERY SHORTEST_PATH A B",
+            "QUERY SHORTEST_PATH C B",
+            "QUERY SHORTEST_PATH A C",
+            "QUERY K_PATHS A B 2",
+            "QUERY SHORTEST_PATH A D",
+            "TRAFFIC_REPORT A B +1",
+            "QUERY SHORTEST_PATH A B",
+            "QUERY SHORTEST_PATH C A",
+            "QUERY SHORTEST_PATH C B",
+        ], 1)]
+        
+        self.assertEqual(find_batched_queries(commands),
+                         {0: False, 2: False, 4: True, 7: False, 8: True})
+    
+    def test_traffic_report_between_batched_queries(self):
+        """Test that a traffic report between runs is seen by the next tree."""
+        graph = TrafficGraph()
+        graph.connect("A", "B", 5)
+        graph.connect("A", "C", 1)
+        graph.connect("C", "B", 1)
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            commands_file = os.path.join(tmpdir, "commands.txt")
+            with open(commands_file, 'w') as f:
+                f.write("QUERY SHORTEST_PATH A B\n"
+                        "QUERY SHORTEST_PATH A C\n"
+                        "TRAFFIC_REPORT C B +10\n"
+                        "QUERY SHORTEST_PATH A B\n"
+                        "QUERY SHORTEST_PATH A C\n")
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                process_commands(graph, commands_file)
+        
+        self.assertEqual(out.getvalue().splitlines(), [
+            "SHORTEST_PATH A B: A -> C -> B (cost: 2)",
+            "SHORTEST_PATH A C: A -> C (cost: 1)",
+            "SHORTEST_PATH A B: A -> B (cost: 5)",
+            "SHORTEST_PATH A C: A -> C (cost: 1)",
+        ])
+        # the last query of each run released its tree
+        self.assertEqual(graph._sssp_cache, {})
+    
+    def test_tree_shortest_path_after_traffic(self):
+        """Test that a cached tree is dropped when a traffic report lands."""
+        graph = TrafficGraph()
+        graph.connect("A", "B", 5)
+        graph.connect("A", "C", 1)
+        graph.connect("C", "B", 1)
+        
+        self.assertEqual(graph.tree_shortest_path("A", "B"), (["A", "C", "B"], 2))
+        graph.apply_traffic_report("C", "B", 10)
+        self.assertEqual(graph.tree_shortest_path("A", "B"), (["A", "B"], 5))
+        self.assertEqual(graph.tree_shortest_path("A", "B"), graph.dijkstra("A", "B"))
+    
+    def test_effective_weight_leaves_stale_csr(self):
+        """Test that effective weights are read without rebuilding a stale CSR view."""
+        graph = TrafficGraph()
+        graph.connect("A", "B", 5)
+        graph.apply_traffic_report("A", "B", -10)
+        
+        self.assertTrue(graph._csr_stale)
+        self.assertEqual(graph.get_effective_weight("A", "B"), 1)
+        self.assertIsNone(graph.get_effective_weight("B", "A"))
+        self.assertIsNone(graph.get_effective_weight("X", "A"))
+        self.assertTrue(graph._csr_stale)
+        
+        graph.build_csr()
+        self.assertEqual(graph.get_effective_weight("A", "B"), 1)
+        self.assertIsNone(graph.get_effective_weight("B", "A"))
+        
+    def assert_astar_costs_match(self, graph, landmarks):
+        """Check A* against plain Dijkstra costs over a sample of city pairs."""
+        cities = sorted(graph.nodes)
+        for start in cities[::7]:
+            for end in cities[::11]:
+                _, cost = graph.dijkstra(start, end)
+                _, astar_cost = graph.dijkstra(start, end, landmarks=landmarks)
+                self.assertEqual(astar_cost, cost, f"{start} -> {end}")
+    
+    def test_astar_matches_dijkstra(self):
+        """Test that landmark A* finds Dijkstra's costs, also after traffic."""
+        graph, _ = parse_input_to_graph(os.path.join(HERE, "input1.txt"),
+                                        graph_cls=TrafficGraph)
+        landmarks = graph.choose_landmarks(4)
+        self.assertEqual(len(landmarks), 4)
+        self.assert_astar_costs_match(graph, landmarks)
+        
+        # a faster road changes the landmark trees the bounds come from
+        for from_city, to_city in [("City18", "City19"), ("City85", "City86"),
+                                   ("City42", "City31")]:
+            graph.apply_traffic_report(from_city, to_city, -50)
+        graph.apply_traffic_report("City31", "City54", 40)
+        self.assert_astar_costs_match(graph, landmarks)
+    
+    def test_astar_unreachable_landmarks(self):
+        """Test A* with landmarks that cannot reach the target or other cities."""
+        graph = TrafficGraph()
+        graph.connect("A", "B", 2)
+        graph.connect("B", "C", 3)
+        graph.connect("A", "C", 10)
+        graph.connect("E", "A", 1)
+        graph.add_node("D")
+        
+        landmarks = ["C", "D", "E"]
+        self.assertEqual(graph.dijkstra("A", "C", landmarks=landmarks), (["A", "B", "C"], 5))
+        self.assertEqual(graph.dijkstra("C", "A", landmarks=landmarks), ([], float('inf')))
+        self.assertEqual(graph.dijkstra("A", "D", landmarks=landmarks), ([], float('inf')))
+    
+    def test_astar_unknown_landmarks_ignored(self):
+        """Test that landmarks naming no city are skipped rather than raising."""
+        graph = TrafficGraph()
+        graph.connect("A", "B", 2)
+        graph.connect("B", "C", 3)
+        
+        self.assertEqual(graph.landmark_distances("C", ["Nowhere"]), [])
+        self.assertEqual(graph.dijkstra("A", "C", landmarks=["Nowhere", "C"]), (["A", "B", "C"], 5))
+        
+    def test_weights_beyond_int64(self):
+        """Test that huge weights and traffic deltas fall back to plain ints."""
+        big = 2 ** 63
+        graph = TrafficGraph()
+        graph.connect("A", "B", big)
+        graph.connect("B", "C", 1)
+        self.assertEqual(graph.dijkstra("A", "C"), (["A", "B", "C"], big + 1))
+        
+        graph.apply_traffic_report("B", "C", big)
+        self.assertEqual(graph.get_effective_weight("B", "C"), big + 1)
+        self.assertEqual(graph.dijkstra("A", "C"), (["A", "B", "C"], 2 * big + 1))